@@ -1,205 +1,804 @@
+import argparse
+import asyncio
+import hashlib
 import json
 import os
+import re
+import signal
+import sys
 import time
-from playwright.sync_api import sync_playwright, Error as PlaywrightError
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from html.parser import HTMLParser
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+from playwright.async_api import async_playwright, Error as PlaywrightError
 
-DEFAULT_PAGE_LOAD_TIMEOUT = 60000  # Milliseconds (60 seconds)
+try:
+    import orjson
+except ImportError:  # Optional: only speeds up reading and writing the output JSON
+    orjson = None
+
+BASE_URL = "https://www.pciconcursos.com.br/provas/"
+CARGOS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cargos.txt")  # One cargo slug per line
+DEFAULT_PAGE_LOAD_TIMEOUT = 8000  # Milliseconds, only until the DOM is parsed, not until ads go idle
+SELECTOR_WAIT_TIMEOUT = 5000  # Milliseconds to wait for script-inserted links after the DOM is loaded
 DEFAULT_NAVIGATION_RETRIES = 2  # Results in (1 initial + 2 retries) = 3 attempts
+RETRY_BACKOFF_SECONDS = 3  # First retry delay, doubled on every further attempt
+HTTP_FETCH_TIMEOUT = 15000  # Milliseconds, for plain HTTP fetches without rendering
+HTTP_FETCH_RETRIES = 2
+MAX_CONSECUTIVE_EXAM_FAILURES = 5  # Give up on the rest of a cargo after this many failed exams in a row
+HTTP_CACHE_DIR = ".httpcache"
+BROWSER_PROFILE_DIR = ".browser-profile"  # Chromium's cookies and HTTP cache, kept between runs
+EXAM_PAGE_CACHE_TTL = 90 * 24 * 60 * 60  # Seconds a cached exam page is trusted without fetching it again
+TRACKING_QUERY_PARAMS = ("utm_", "fbclid", "gclid")
+SNAPSHOT_EVERY = 25  # Journaled exams between full rewrites of the output JSON
+SNAPSHOT_SECONDS = 30  # ...or seconds, whichever comes first
+SNAPSHOT_JOURNAL_RATIO = 10  # On big outputs, wait for a journal of 1/N of the exams so rewrites stay amortized
+JSON_WRITE_BUFFER_SIZE = 64 * 1024
+# Exam fields whose values repeat across thousands of exams (same position, agency, year, cargo...)
+INTERNED_EXAM_FIELDS = ("position", "year", "agency", "organizer", "level", "cargo_source")
+CARGO_RECRAWL_AFTER = 24 * 60 * 60  # Seconds before a completed cargo is crawled again
+REQUESTS_PER_SECOND = 5  # Upper bound on page requests per process
+MIN_REQUESTS_PER_SECOND = 0.5  # Floor for the rate while the server is pushing back
+RATE_RECOVERY_STEP = 0.1  # Requests per second regained after each successful response
+THROTTLE_STATUSES = (429, 503)
+MAX_RETRY_AFTER_SECONDS = 60  # A longer Retry-After would hold a page slot; the rate limiter slows down instead
+GONE_STATUSES = (404, 410)  # Pages that won't come back by retrying or rendering them
+# Navigation errors that retrying the same URL can't fix
+PERMANENT_NAVIGATION_ERRORS = ("ERR_NAME_NOT_RESOLVED", "ERR_INVALID_URL", "ERR_BLOCKED_BY_CLIENT")
+VERBOSE_ENV_VAR = "PCI_SCRAPPER_VERBOSE"  # Set (or pass --verbose) to print a line for every exam
+MAX_PARALLEL_PAGES = 5  # Default for pages loading at once across all cargo workers (--parallel-pages)
+PAGE_MAX_USES = 50  # Navigations before a pooled page is closed, so leaked DOM/JS heap doesn't pile up
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet"}
+ALLOWED_HOST_SUFFIX = "pciconcursos.com.br"  # Requests to any other host (ads, analytics, CDNs) are aborted
+_PDF_HREF_RE = re.compile(r"\.pdf", re.IGNORECASE)
+_SLUG_SEPARATORS = str.maketrans({"-": " ", "_": " "})
+_verbose = bool(os.environ.get(VERBOSE_ENV_VAR))
+CHROMIUM_ARGS = [
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--blink-settings=imagesEnabled=false",
+    # Pages run in the background of a headless browser; don't let Chromium throttle their timers
+    "--disable-background-timer-throttling",
+    "--disable-renderer-backgrounding",
+    "--disable-features=TranslateUI",
+]
+# Only the DOM is read: a small viewport keeps layout cheap, and blocked service workers keep
+# every request visible to the route that filters them
+CONTEXT_OPTIONS = {
+    "viewport": {"width": 800, "height": 600},
+    "service_workers": "block",
+}
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+
+def print_verbose(message):
+    """Per-page and per-exam progress, only printed with --verbose"""
+    if _verbose:
+        print(message)
+
+
+class RateLimiter:
+    """Spaces requests at least 1/rate seconds apart, sleeping only when they arrive faster than that.
+
+    The rate adapts to the server: it is halved whenever a response says we are going too fast
+    and grows back by RATE_RECOVERY_STEP with every successful one, up to the initial rate.
+    """
+
+    def __init__(self, rate, min_rate=MIN_REQUESTS_PER_SECOND):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self._next_slot = 0.0
+
+    def slow_down(self):
+        self.rate = max(self.min_rate, self.rate / 2)
+        print(f"Server is throttling, slowing down to {self.rate:.2f} requests per second")
+
+    def speed_up(self):
+        self.rate = min(self.max_rate, self.rate + RATE_RECOVERY_STEP)
+
+    async def wait(self):
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + 1.0 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class PagePool:
+    """Idle pages of one browser context, reused across navigations and workers instead of opened each time"""
+
+    def __init__(self, context, max_uses=PAGE_MAX_USES):
+        self.context = context
+        self.max_uses = max_uses
+        self._idle_pages = []  # (page, times used)
+
+    @asynccontextmanager
+    async def page(self):
+        page, uses = self._idle_pages.pop() if self._idle_pages else (await self.context.new_page(), 0)
+        try:
+            yield page
+        except BaseException:
+            await page.close()  # Don't hand a page in an unknown state to the next caller
+            raise
+        if uses + 1 < self.max_uses:
+            self._idle_pages.append((page, uses + 1))
+        else:
+            await page.close()
+
+    async def close(self):
+        while self._idle_pages:
+            page, _ = self._idle_pages.pop()
+            await page.close()
+
+
+async def block_unneeded_requests(route):
+    """Abort requests the extractors never look at, they only need the HTML DOM"""
+    request = route.request
+    host = urlsplit(request.url).hostname or ""
+    allowed_host = host == ALLOWED_HOST_SUFFIX or host.endswith("." + ALLOWED_HOST_SUFFIX)
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or not allowed_host:
+        await route.abort()
+    else:
+        await route.continue_()
 
 
-def navigate_with_retry(page, url, wait_strategy="networkidle", timeout=DEFAULT_PAGE_LOAD_TIMEOUT,
-                        retries=DEFAULT_NAVIGATION_RETRIES):
+async def navigate_with_retry(page, url, wait_strategy="domcontentloaded", timeout=DEFAULT_PAGE_LOAD_TIMEOUT,
+                              retries=DEFAULT_NAVIGATION_RETRIES, rate_limiter=None):
+    """Load a page, returns False when it failed or answered with an error page.
+
+    Server errors and throttling are retried with backoff, and reported to the rate limiter if given;
+    other 4xx responses won't change by retrying, so they fail right away.
+    """
     for attempt in range(retries + 1):
+        delay = RETRY_BACKOFF_SECONDS * 2 ** attempt
         try:
-            current_timeout = timeout + (attempt * 15000)
-            page.goto(url, wait_until=wait_strategy, timeout=current_timeout)
-            return True
+            if rate_limiter:
+                await rate_limiter.wait()
+            current_timeout = timeout * (attempt + 1)  # A page that was merely slow gets more time on retry
+            response = await page.goto(url, wait_until=wait_strategy, timeout=current_timeout)
+            if response is None or response.status < 400:
+                if rate_limiter:
+                    rate_limiter.speed_up()
+                return True
+            print(f"HTTP {response.status} (Attempt {attempt + 1}/{retries + 1}) navigating to {url}")
+            if response.status in THROTTLE_STATUSES:
+                if rate_limiter:
+                    rate_limiter.slow_down()
+                delay = max(delay, retry_after_seconds(response))
+            elif response.status < 500:
+                print(f"Not retrying {url}.")
+                return False
         except PlaywrightError as e:
             print(f"Playwright Error (Attempt {attempt + 1}/{retries + 1}) navigating to {url}: {e}")
-            if attempt == retries:
-                print(f"All navigation attempts failed for {url}.")
+            if any(error in str(e) for error in PERMANENT_NAVIGATION_ERRORS):
+                print(f"Not retrying {url}.")
                 return False
-            time.sleep(3 + attempt * 2)
+        if attempt == retries:
+            print(f"All navigation attempts failed for {url}.")
+            return False
+        await asyncio.sleep(delay)
     return False
 
 
-def extract_pdf_urls_from_page(page, exam_url):
-    print(f"Extracting PDF URLs from {exam_url}")
+async def wait_for_selector_quietly(page, selector, timeout=SELECTOR_WAIT_TIMEOUT):
+    """Give scripts a moment to insert the elements we need; parse whatever is there if they never show up"""
+    try:
+        await page.wait_for_selector(selector, timeout=timeout)
+    except PlaywrightError:
+        pass
 
-    if not navigate_with_retry(page, exam_url, wait_strategy="networkidle"):
-        return []
 
-    pdf_links = page.evaluate("""() => {
-        const pdfLinks = [];
-        const allLinks = document.querySelectorAll("a");
-        const baseUrl = window.location.origin;
-
-        for (const link of allLinks) {
-            if (link.textContent.includes("Baixar")) {
-                const href = link.getAttribute("href");
-                if (href && href.includes(".pdf")) {
-                    pdfLinks.push(href.startsWith("http") ? href : baseUrl + href);
-                }
-            }
-        }
-
-        if (pdfLinks.length === 0) {
-            for (const link of allLinks) {
-                const href = link.getAttribute("href");
-                if (href && href.includes(".pdf")) {
-                    pdfLinks.push(href.startsWith("http") ? href : baseUrl + href);
-                }
-            }
-        }
-        return [...new Set(pdfLinks)];
-    }""")
-
-    return pdf_links
-
-
-def extract_exam_links_from_cargo_page(page, cargo_url):
-    print(f"Extracting exam links from {cargo_url}")
-
-    if not navigate_with_retry(page, cargo_url, wait_strategy="load"):
+async def extract_pdf_urls_from_page(page, exam_url, rate_limiter=None):
+    print_verbose(f"Extracting PDF URLs from {exam_url}")
+
+    if not await navigate_with_retry(page, exam_url, rate_limiter=rate_limiter):
+        return None
+    await wait_for_selector_quietly(page, 'a[href*=".pdf" i]')
+
+    # Parse the rendered DOM with the same code as the HTTP path instead of querying it over CDP
+    return parse_pdf_urls(await page.content(), page.url)
+
+
+async def extract_exam_links_from_cargo_page(page, cargo_url, rate_limiter=None):
+    print_verbose(f"Extracting exam links from {cargo_url}")
+
+    if not await navigate_with_retry(page, cargo_url, rate_limiter=rate_limiter):
+        return None
+    await wait_for_selector_quietly(page, "table tr td a")
+
+    # Still no table after rendering: treat it as a failed load rather than a cargo without exams
+    return parse_exam_links(await page.content(), page.url)
+
+
+class _AnchorParser(HTMLParser):
+    """Collect (href, text) for every <a> in a document, or only those whose href matches href_pattern"""
+
+    def __init__(self, href_pattern=None):
+        super().__init__()
+        self.anchors = []
+        self._href_pattern = href_pattern
+        self._href = None
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            href = dict(attrs).get("href")
+            # Filtering here spares collecting the text of the page's many navigation links
+            if href is not None and self._href_pattern and not self._href_pattern.search(href):
+                href = None
+            self._href = href
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if tag == "a" and self._href is not None:
+            self.anchors.append((self._href, "".join(self._text)))
+            self._href = None
+
+    def handle_data(self, data):
+        if self._href is not None:
+            self._text.append(data)
+
+
+class _TableRowParser(HTMLParser):
+    """Collect the cells of every table row, keeping each cell's text and its first link"""
+
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+        self.table_count = 0
+        self._table_depth = 0
+        self._row = None
+        self._cell = None
+        self._in_link = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            self.table_count += 1
+            self._table_depth += 1
+        elif not self._table_depth:
+            return
+        elif tag == "tr":
+            self._row = []
+            self._cell = None
+            self.rows.append(self._row)
+        elif tag in ("td", "th") and self._row is not None:
+            self._cell = {"tag": tag, "text": [], "href": None, "link_text": []}
+            self._row.append(self._cell)
+        elif tag == "a" and self._cell is not None and self._cell["href"] is None:
+            self._cell["href"] = dict(attrs).get("href") or ""
+            self._in_link = True
+
+    def handle_endtag(self, tag):
+        if tag == "table":
+            self._table_depth = max(0, self._table_depth - 1)
+        elif tag == "a":
+            self._in_link = False
+        elif tag in ("td", "th"):
+            self._cell = None
+        elif tag == "tr":
+            self._row = None
+            self._cell = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell["text"].append(data)
+            if self._in_link:
+                self._cell["link_text"].append(data)
+
+
+def select_pdf_urls(anchors, page_url):
+    """Pick the exam's PDFs from (href, text) pairs: "Baixar" links first, otherwise any PDF link"""
+    baixar_links, other_links = [], []
+    for href, text in anchors:
+        if href and _PDF_HREF_RE.search(href):
+            (baixar_links if "Baixar" in text else other_links).append(href)
+    pdf_links = baixar_links or other_links
+    return list(dict.fromkeys(canonical_pdf_url(href, page_url) for href in pdf_links))
+
+
+def canonical_pdf_url(href, page_url):
+    """Absolute URL without fragment or host case, so the same PDF linked two ways is stored once"""
+    scheme, netloc, path, query, _ = urlsplit(urljoin(page_url, href.strip()))
+    return urlunsplit((scheme.lower(), netloc.lower(), path, query, ""))
+
+
+def parse_pdf_urls(html, page_url):
+    # One regex scan of the raw HTML is much cheaper than the parse, and rules out pages without PDFs
+    if not _PDF_HREF_RE.search(html):
         return []
+    parser = _AnchorParser(_PDF_HREF_RE)
+    parser.feed(html)
+    return select_pdf_urls(parser.anchors, page_url)
+
+
+def parse_exam_links(html, cargo_url):
+    """Exam url, position, year, agency, organizer and level from each row of the cargo's exam table.
 
-    exam_links = page.evaluate("""() => {
-        const examLinks = [];
-        const rows = document.querySelectorAll("table tr");
-
-        for (let i = 1; i < rows.length; i++) {
-            const row = rows[i];
-            const firstCell = row.querySelector("td:first-child");
-            if (firstCell) {
-                const linkElement = firstCell.querySelector("a");
-                if (linkElement && linkElement.href) {
-                    examLinks.push({
-                        url: linkElement.href,
-                        position: linkElement.textContent.trim(),
-                        year: row.querySelector("td:nth-child(2)")?.textContent.trim() || "",
-                        agency: row.querySelector("td:nth-child(3) a")?.textContent.trim() || "",
-                        organizer: row.querySelector("td:nth-child(4) a")?.textContent.trim() || "",
-                        level: row.querySelector("td:nth-child(5)")?.textContent.trim() || ""
-                    });
-                }
-            }
-        }
-        return examLinks;
-    }""")
+    Returns None if the page has no table at all.
+    """
+    parser = _TableRowParser()
+    parser.feed(html)
+    if not parser.table_count:
+        return None
 
+    def cell(row, index):
+        return row[index] if len(row) > index and row[index]["tag"] == "td" else None
+
+    def cell_text(row, index):
+        found = cell(row, index)
+        return "".join(found["text"]).strip() if found else ""
+
+    def cell_link_text(row, index):
+        found = cell(row, index)
+        return "".join(found["link_text"]).strip() if found and found["href"] is not None else ""
+
+    exam_links = []
+    for row in parser.rows[1:]:
+        first_cell = cell(row, 0)
+        if not first_cell or not first_cell["href"]:
+            continue
+        exam_links.append({
+            "url": urljoin(cargo_url, first_cell["href"]),
+            "position": cell_link_text(row, 0),
+            "year": cell_text(row, 1),
+            "agency": cell_link_text(row, 2),
+            "organizer": cell_link_text(row, 3),
+            "level": cell_text(row, 4)
+        })
     return exam_links
 
 
-def save_single_exam_to_json(exam_data, file_path):
-    """Save a single exam entry to the JSON file immediately"""
+def normalize_url(url):
+    """Drop the fragment and tracking parameters so equivalent URLs share a cache entry"""
+    scheme, netloc, path, query, _ = urlsplit(url)
+    query_params = [(k, v) for k, v in parse_qsl(query, keep_blank_values=True)
+                    if not k.startswith(TRACKING_QUERY_PARAMS)]
+    return urlunsplit((scheme, netloc.lower(), path, urlencode(query_params), ""))
+
+
+class HttpCache:
+    """HTML bodies stored on disk, one file per sha1 of the normalized URL.
+
+    With refresh, entries are never read (every page is fetched again) but are still written.
+    """
+
+    def __init__(self, cache_dir=HTTP_CACHE_DIR, enabled=True, refresh=False):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.refresh = refresh
+
+    def _path(self, url, extension=".html"):
+        digest = hashlib.sha1(normalize_url(url).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest + extension)
+
+    def _write(self, path, text):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def get(self, url, max_age=None):
+        """The cached HTML, or None if there is none or it is older than max_age seconds"""
+        if not self.enabled or self.refresh:
+            return None
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                if max_age is not None and time.time() - os.fstat(f.fileno()).st_mtime > max_age:
+                    return None
+                return f.read()
+        except OSError:
+            return None
+
+    def get_validators(self, url):
+        """ETag/Last-Modified and redirect target ("url") saved along with the cached page, {} if there are none"""
+        if not self.enabled or self.refresh:
+            return {}
+        try:
+            with open(self._path(url, ".json"), "rb") as f:
+                validators = json_loads(f.read())
+            return validators if isinstance(validators, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def put(self, url, html, validators=None):
+        if not self.enabled:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._write(self._path(url), html)
+            if validators:
+                self._write(self._path(url, ".json"), json.dumps(validators))
+            elif os.path.exists(self._path(url, ".json")):
+                os.remove(self._path(url, ".json"))  # Validators of an older copy don't describe this one
+        except OSError as e:
+            print(f"Error writing cache entry for {url}: {e}")
+
+
+def retry_after_seconds(response):
+    """The Retry-After delay of a throttled response, if given in seconds, capped at MAX_RETRY_AFTER_SECONDS"""
     try:
-        # Load existing data
-        existing_data = []
-        if os.path.exists(file_path):
-            with open(file_path, "r", encoding="utf-8") as f:
-                existing_data = json.load(f)
-
-        # Add new exam data
-        existing_data.append(exam_data)
-
-        # Save updated data
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(existing_data, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception as e:
-        print(f"Error saving exam data to {file_path}: {e}")
-        return False
+        return min(max(0.0, float(response.headers.get("retry-after", ""))), MAX_RETRY_AFTER_SECONDS)
+    except ValueError:
+        return 0.0
 
 
-def update_existing_exam_in_json(exam_data, exam_index, file_path):
-    """Update an existing exam entry in the JSON file"""
+async def dispose_response(response):
+    """Let Playwright free a response body; it otherwise keeps every one until the context closes"""
     try:
-        # Load existing data
-        with open(file_path, "r", encoding="utf-8") as f:
-            existing_data = json.load(f)
+        await response.dispose()
+    except PlaywrightError:
+        pass
 
-        # Update the specific exam
-        existing_data[exam_index] = exam_data
 
-        # Save updated data
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(existing_data, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception as e:
-        print(f"Error updating exam data in {file_path}: {e}")
-        return False
+async def read_response_text(response, url):
+    """The body of a response, or None when reading it fails; the response is disposed either way"""
+    try:
+        return await response.text()
+    except (PlaywrightError, ValueError) as e:  # ValueError covers a body that doesn't decode
+        print(f"HTTP error reading the body of {url}: {e}")
+        return None
+    finally:
+        await dispose_response(response)
+
+
+async def fetch_response(context, url, headers=None, rate_limiter=None, retries=HTTP_FETCH_RETRIES):
+    """GET a URL over plain HTTP, returns the response (a 304 counts as success) or None when it fails.
+
+    A 404/410 response is returned as well, without retrying, so callers can tell a page that is gone
+    from a request that failed. Every attempt waits for the rate limiter, if given, and tells it
+    whether the server throttled us. Callers must dispose of the returned response.
+    """
+    for attempt in range(retries + 1):
+        delay = RETRY_BACKOFF_SECONDS * 2 ** attempt
+        try:
+            if rate_limiter:
+                await rate_limiter.wait()
+            response = await context.request.get(url, headers=headers, timeout=HTTP_FETCH_TIMEOUT)
+            if response.ok or response.status == 304:
+                if rate_limiter:
+                    rate_limiter.speed_up()
+                return response
+            if response.status in GONE_STATUSES:
+                return response
+            print(f"HTTP {response.status} (Attempt {attempt + 1}/{retries + 1}) fetching {url}")
+            await dispose_response(response)
+            if response.status in THROTTLE_STATUSES:
+                if rate_limiter:
+                    rate_limiter.slow_down()
+                delay = max(delay, retry_after_seconds(response))
+            elif response.status < 500:
+                return None  # Other client errors won't go away by retrying
+        except PlaywrightError as e:
+            print(f"HTTP error (Attempt {attempt + 1}/{retries + 1}) fetching {url}: {e}")
+        if attempt < retries:
+            await asyncio.sleep(delay)
+    return None
+
+
+async def fetch_revalidated_html(context, http_cache, url, rate_limiter=None):
+    """Fetch a page conditionally on its cached ETag/Last-Modified, reusing the cached HTML on a 304.
+
+    Returns (html, status, page_url), html being None when the request failed or the page is gone,
+    status being None when no response came back and page_url being where the page ended up after
+    redirects, to resolve its relative links against.
+    """
+    cached_html = http_cache.get(url)
+    validators = http_cache.get_validators(url) if cached_html is not None else {}
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last-modified"):
+        headers["If-Modified-Since"] = validators["last-modified"]
+
+    response = await fetch_response(context, url, headers=headers or None, rate_limiter=rate_limiter)
+    if response is None:
+        return None, None, url
+    if response.status in GONE_STATUSES:
+        await dispose_response(response)
+        return None, response.status, url
+    if response.status == 304:
+        await dispose_response(response)
+        print(f"{url} has not changed since the last run")
+        return cached_html, response.status, validators.get("url", url)
+
+    html = await read_response_text(response, url)
+    if html is None:
+        return None, None, url
+    validators = {name: response.headers[name] for name in ("etag", "last-modified") if response.headers.get(name)}
+    if validators:
+        if response.url != url:
+            validators["url"] = response.url
+        http_cache.put(url, html, validators)
+    return html, response.status, response.url
+
+
+async def get_exam_links(page_pool, page_semaphore, rate_limiter, http_cache, cargo_url):
+    """Read the cargo's exam table over HTTP, rendering it in the browser only when that fails.
+
+    Returns (exam_links, not_modified), exam_links being None when the listing couldn't be loaded
+    and not_modified meaning the server confirmed the listing is the same as in the last run.
+    """
+    html, status, page_url = await fetch_revalidated_html(page_pool.context, http_cache, cargo_url, rate_limiter)
+    if status in GONE_STATUSES:
+        # Rendering a page the server says is gone would only load the same error page
+        print(f"{cargo_url} returned HTTP {status}, the cargo has no exams.")
+        return [], False
+    if html is not None:
+        # An empty table is a cargo without exams, only a missing one means the static HTML wasn't enough
+        exam_links = parse_exam_links(html, page_url)
+        if exam_links is not None:
+            return exam_links, status == 304
+
+    print(f"Falling back to the browser for {cargo_url}")
+    async with page_semaphore, page_pool.page() as page:
+        return await extract_exam_links_from_cargo_page(page, cargo_url, rate_limiter), False
+
+
+def build_exam_key(exam):
+    # A tuple hashes without building a string, and "A - B" + "C" can't collide with "A" + "B - C"
+    return exam.get('position', ''), exam.get('agency', ''), exam.get('year', '')
+
+
+def format_exam_key(exam_key):
+    return "{} - {} - {}".format(*exam_key)
+
+
+class _PendingFetch:
+    """An exam page fetch in flight and how many cargos are waiting on it"""
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+# Exam page fetches in flight, by normalized URL, so cargos listing the same exam share one fetch
+_pending_pdf_fetches = {}
+
+
+def _forget_pending_fetch(fetch_key, pending):
+    if _pending_pdf_fetches.get(fetch_key) is pending:
+        del _pending_pdf_fetches[fetch_key]
+
 
+async def fetch_pdf_urls(page_pool, page_semaphore, rate_limiter, http_cache, exam_url):
+    """Fetch the PDF URLs of one exam, bounded by the shared semaphore and rate limiter; None if the page failed"""
+    fetch_key = normalize_url(exam_url)
+    pending = _pending_pdf_fetches.get(fetch_key)
+    if pending is None:
+        pending = _PendingFetch(asyncio.create_task(
+            _fetch_pdf_urls(page_pool, page_semaphore, rate_limiter, http_cache, exam_url)))
+        _pending_pdf_fetches[fetch_key] = pending
+        pending.task.add_done_callback(lambda _: _forget_pending_fetch(fetch_key, pending))
+    pending.waiters += 1
+    try:
+        # Shielded so one cargo giving up on its exams doesn't cancel a fetch another cargo is waiting on
+        return await asyncio.shield(pending.task)
+    except asyncio.CancelledError:
+        if pending.waiters == 1:
+            # Nobody else wants the result: stop the fetch so it frees its page slot and rate budget
+            _forget_pending_fetch(fetch_key, pending)
+            pending.task.cancel()
+        raise
+    finally:
+        pending.waiters -= 1
+
+
+async def _fetch_pdf_urls(page_pool, page_semaphore, rate_limiter, http_cache, exam_url):
+    cached_html = http_cache.get(exam_url, max_age=EXAM_PAGE_CACHE_TTL)
+    if cached_html is not None:
+        return parse_pdf_urls(cached_html, http_cache.get_validators(exam_url).get("url", exam_url))
+
+    async with page_semaphore:
+        response = await fetch_response(page_pool.context, exam_url, rate_limiter=rate_limiter)
+        if response is not None and response.status in GONE_STATUSES:
+            await dispose_response(response)
+            # Stored as an exam without PDFs, so later runs don't ask for it again
+            print(f"{exam_url} returned HTTP {response.status}, storing it without PDFs.")
+            return []
+        html = await read_response_text(response, exam_url) if response is not None else None
+        if html is not None:
+            # Relative links resolve against where a redirect landed, as they do in the browser
+            page_url = response.url
+            http_cache.put(exam_url, html, {"url": page_url} if page_url != exam_url else None)
+            return parse_pdf_urls(html, page_url)
+
+        print(f"Falling back to the browser for {exam_url}")
+        async with page_pool.page() as page:
+            return await extract_pdf_urls_from_page(page, exam_url, rate_limiter)
+
+
+def listing_updates(existing_exam, exam_details):
+    """Fields of a listing row to apply to a stored exam.
 
-def process_cargo_page(page, cargo_name, cargo_url, all_exams_data_list, output_json_file):
+    The same exam is listed under several overlapping cargos; its cargo_source stays the cargo
+    that first found it, instead of flipping (and being journaled again) on every cargo.
+    """
+    if 'cargo_source' not in existing_exam:
+        return exam_details
+    return {field: value for field, value in exam_details.items() if field != 'cargo_source'}
+
+
+async def process_cargo_page(page_pool, page_semaphore, rate_limiter, http_cache, exam_store, cargo_name, cargo_url,
+                             force=False):
     print(f"Processing cargo: {cargo_name} at {cargo_url}")
+    all_exams_data_list = exam_store.exams
 
-    exam_link_list = extract_exam_links_from_cargo_page(page, cargo_url)
+    exam_link_list, listing_not_modified = await get_exam_links(page_pool, page_semaphore, rate_limiter, http_cache,
+                                                                cargo_url)
 
+    if exam_link_list is None:
+        print(f"Failed to load the exam listing for {cargo_name} at {cargo_url}. Skipping.")
+        return
     if not exam_link_list:
-        print(f"No exam links found or failed to load page for {cargo_name} at {cargo_url}. Skipping.")
+        print(f"No exams listed for {cargo_name} at {cargo_url}.")
+        exam_store.mark_cargo_done(cargo_name, 0)
+        exam_store.checkpoint()
+        return
+
+    # Same listing as a crawl that got every exam, and those exams are all still stored: nothing in it can be new
+    if (not force and listing_not_modified and exam_store.cargo_is_fresh(cargo_name, max_age=float("inf"))
+            and exam_store.holds_listing(exam_link_list)):
+        print(f"{cargo_name} is unchanged since it was last completed. Skipping its exams.")
+        exam_store.mark_cargo_done(cargo_name, len(exam_link_list))
+        exam_store.checkpoint()
         return
 
     print(f"Found {len(exam_link_list)} exam links for {cargo_name}")
 
-    for i, exam_details in enumerate(exam_link_list):
-        exam_details['cargo_source'] = cargo_name
+    # Schedule every exam that still lacks PDF URLs up front so the pages load concurrently.
+    # If too many fail in a row the site is likely struggling, so the rest of the cargo is
+    # cancelled and left for the next run.
+    fetch_tasks = {}
+    consecutive_failures = 0
 
-        position = exam_details.get('position', 'N/A')
-        agency = exam_details.get('agency', 'N/A')
-        year = exam_details.get('year', 'N/A')
+    async def fetch_exam(exam_url):
+        nonlocal consecutive_failures
+        pdf_urls = await fetch_pdf_urls(page_pool, page_semaphore, rate_limiter, http_cache, exam_url)
+        if pdf_urls is not None:
+            consecutive_failures = 0
+        else:
+            consecutive_failures += 1
+            if consecutive_failures == MAX_CONSECUTIVE_EXAM_FAILURES:
+                print(f"{consecutive_failures} exams of {cargo_name} failed in a row. Cancelling the rest.")
+                for task in fetch_tasks.values():
+                    if task is not asyncio.current_task():
+                        task.cancel()
+        return pdf_urls
 
-        print(f"Processing exam {i + 1}/{len(exam_link_list)}: {position} - {agency} - {year}")
+    known_pdf_urls = {}
+    for exam_details in exam_link_list:
+        exam_details['cargo_source'] = cargo_name
+        exam_key = build_exam_key(exam_details)
+        found_exam_index = exam_store.find(exam_key)
+        if exam_key in fetch_tasks or exam_key in known_pdf_urls or (
+                found_exam_index != -1 and 'PdfUrls' in all_exams_data_list[found_exam_index]):
+            continue
+        # The page may have been scraped already under other details (e.g. a renamed agency)
+        pdf_urls = exam_store.known_pdf_urls(exam_details["url"])
+        if pdf_urls is not None:
+            known_pdf_urls[exam_key] = list(pdf_urls)
+            continue
+        fetch_tasks[exam_key] = asyncio.create_task(fetch_exam(exam_details["url"]))
 
-        current_exam_key = f"{position} - {agency} - {year}"
+    results = await asyncio.gather(*fetch_tasks.values(), return_exceptions=True)
+    fetched_pdf_urls = {
+        exam_key: None if isinstance(result, BaseException) else result
+        for exam_key, result in zip(fetch_tasks, results)
+    }
+    fetched_pdf_urls.update(known_pdf_urls)
+    failed_exams = sum(1 for pdf_urls in fetched_pdf_urls.values() if pdf_urls is None)
 
-        found_exam_index = -1
-        for idx, existing_exam in enumerate(all_exams_data_list):
-            existing_key = f"{existing_exam.get('position', '')} - {existing_exam.get('agency', '')} - {existing_exam.get('year', '')}"
-            if existing_key == current_exam_key:
-                found_exam_index = idx
-                break
+    total_exams = len(exam_link_list)
+    for i, exam_details in enumerate(exam_link_list, start=1):
+        current_exam_key = build_exam_key(exam_details)
+        exam_label = format_exam_key(current_exam_key)
+        print_verbose(f"Processing exam {i}/{total_exams}: {exam_label}")
+
+        found_exam_index = exam_store.find(current_exam_key)
 
         if found_exam_index != -1 and 'PdfUrls' in all_exams_data_list[found_exam_index]:
-            print(f"Data for '{current_exam_key}' with PDF URLs already processed. Updating other details.")
-            all_exams_data_list[found_exam_index].update(exam_details)
-            update_existing_exam_in_json(all_exams_data_list[found_exam_index], found_exam_index, output_json_file)
-            time.sleep(0.5)
+            print_verbose(f"Data for '{exam_label}' with PDF URLs already processed. Updating other details.")
+            existing_exam = all_exams_data_list[found_exam_index]
+            updates = listing_updates(existing_exam, exam_details)
+            if any(existing_exam.get(field) != value for field, value in updates.items()):
+                existing_exam.update(updates)
+                exam_store.record(existing_exam)
             continue
 
-        pdf_urls = extract_pdf_urls_from_page(page, exam_details["url"])
+        pdf_urls = fetched_pdf_urls[current_exam_key]
 
-        if found_exam_index != -1:
+        if pdf_urls is None:
+            # Keep the details but leave PdfUrls unset, so the next run fetches this exam again
+            if found_exam_index == -1:
+                exam_store.add(exam_details)
+            else:
+                existing_exam = all_exams_data_list[found_exam_index]
+                updates = listing_updates(existing_exam, exam_details)
+                if any(existing_exam.get(field) != value for field, value in updates.items()):
+                    existing_exam.update(updates)
+                    exam_store.record(existing_exam)
+            print(f"Could not load the exam page for '{exam_label}'. It will be retried on the next run.")
+        elif found_exam_index != -1:
             # Update existing exam
-            all_exams_data_list[found_exam_index].update(exam_details)
-            all_exams_data_list[found_exam_index]['PdfUrls'] = pdf_urls if pdf_urls else []
-            update_existing_exam_in_json(all_exams_data_list[found_exam_index], found_exam_index, output_json_file)
+            all_exams_data_list[found_exam_index].update(
+                listing_updates(all_exams_data_list[found_exam_index], exam_details))
+            all_exams_data_list[found_exam_index]['PdfUrls'] = pdf_urls
+            exam_store.record(all_exams_data_list[found_exam_index])
             if pdf_urls:
-                print(f"Updated PDF URLs for existing entry '{current_exam_key}'")
+                print_verbose(f"Updated PDF URLs for existing entry '{exam_label}'")
             else:
-                print(f"No new PDF URLs found or page load failed for '{current_exam_key}'.")
+                print_verbose(f"No new PDF URLs found for '{exam_label}'.")
         else:
-            # Add new exam
-            new_exam_entry = exam_details.copy()
-            new_exam_entry['PdfUrls'] = pdf_urls if pdf_urls else []
-            all_exams_data_list.append(new_exam_entry)
-            save_single_exam_to_json(new_exam_entry, output_json_file)
+            # Add new exam; each listing row is a fresh dict, so it can be stored as is
+            exam_details['PdfUrls'] = pdf_urls
+            exam_store.add(exam_details)
             if pdf_urls:
-                print(f"Added new exam for '{current_exam_key}' with PDF URLs.")
+                print_verbose(f"Added new exam for '{exam_label}' with PDF URLs.")
             else:
-                print(f"Added new exam for '{current_exam_key}' (no PDF URLs found or page load failed).")
+                print_verbose(f"Added new exam for '{exam_label}' (no PDF URLs found).")
+
+            print_verbose(f"Total exams added: {len(all_exams_data_list)}\n")
+
+    if failed_exams:
+        exam_store.mark_cargo_needs_retry(cargo_name)
+        print(f"{failed_exams} exams of {cargo_name} could not be loaded. The cargo will be crawled again.")
+    else:
+        exam_store.mark_cargo_done(cargo_name, total_exams)
+    exam_store.checkpoint()
+
+    print(f"Completed processing {cargo_name}: {total_exams} exams, {len(all_exams_data_list)} in total")
+
+
+def intern_exam_fields(exam):
+    """Share one string object per distinct value of the repetitive fields, instead of one per exam"""
+    for field in INTERNED_EXAM_FIELDS:
+        value = exam.get(field)
+        if type(value) is str:
+            exam[field] = sys.intern(value)
+    return exam
+
 
-            print(f"Total exams added: {len(all_exams_data_list)}\n")
+def cargo_name_from_slug(slug):
+    """"agente-de-saude" -> "Agente De Saude", in a single translate pass"""
+    return slug.translate(_SLUG_SEPARATORS).title()
 
-        time.sleep(2)
 
-    print(f"Completed processing {cargo_name}")
+async def cargo_worker(page_pool, cargo_queue, page_semaphore, rate_limiter, http_cache, exam_store, total_cargos,
+                       force=False):
+    """Process cargos from the shared queue until it is empty"""
+    while True:
+        try:
+            i, cargo_name, cargo_url = cargo_queue.get_nowait()
+        except asyncio.QueueEmpty:
+            break
+
+        print(f"\nProcessing CARGO {i + 1}/{total_cargos}: {cargo_name}")
+        await process_cargo_page(page_pool, page_semaphore, rate_limiter, http_cache, exam_store, cargo_name,
+                                 cargo_url, force)
+
+
+def json_loads(raw):
+    """Parse JSON from bytes or str, with orjson when it is installed"""
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
+
+def json_dumps_line(data):
+    """One compact JSON document as a newline-terminated UTF-8 line"""
+    if orjson:
+        return orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE)
+    return json.dumps(data, ensure_ascii=False).encode("utf-8") + b"\n"
 
 
 def load_existing_data(file_path):
     if os.path.exists(file_path):
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            with open(file_path, "rb") as f:
+                raw = f.read()
+            data = json_loads(raw)
             if not isinstance(data, list):
                 print(f"Warning: Content of {file_path} was not a list. Reinitializing.")
                 return []
@@ -226,414 +825,437 @@ def create_initial_json_file(file_path):
             print(f"Error creating initial JSON file {file_path}: {e}")
             return False
     else:
-        print(f"JSON file {file_path} already exists.")
+        print(f"JSON file {file_path} already exists and will be used to add pending exams.")
         return True
 
 
-def save_data_to_json(data, file_path):
+def save_data_to_json(data, file_path, compact=False):
+    """Write data to a temporary file and swap it in, so a crash mid-write never leaves a truncated file"""
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
     try:
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        if orjson:
+            with open(tmp_path, "wb", buffering=JSON_WRITE_BUFFER_SIZE) as f:
+                f.write(orjson.dumps(data, option=0 if compact else orjson.OPT_INDENT_2))
+                f.flush()
+                os.fsync(f.fileno())
+        else:
+            with open(tmp_path, "w", encoding="utf-8", buffering=JSON_WRITE_BUFFER_SIZE) as f:
+                if compact:
+                    json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+                else:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
         return True
     except Exception as e:
         print(f"Error saving data to {file_path}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
         return False
 
 
-def main():
+def journal_path(output_json_file):
+    return os.path.splitext(output_json_file)[0] + ".jsonl"
+
+
+def cargos_done_path(output_json_file):
+    return os.path.splitext(output_json_file)[0] + ".cargos_done.json"
+
+
+def load_cargos_done(file_path):
+    """{cargo_name: {"last_updated": unix_ts, "exam_count": n}} for crawled cargos, or "needs_retry": true"""
+    try:
+        with open(file_path, "rb") as f:
+            cargos_done = json_loads(f.read())
+        return cargos_done if isinstance(cargos_done, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Error loading {file_path}: {e}. Every cargo will be crawled.")
+        return {}
+
+
+def read_journal(journal_file):
+    """Yield the exams journaled in a JSONL file, skipping lines torn by a crash"""
+    if not os.path.exists(journal_file):
+        return
+    with open(journal_file, "rb") as f:
+        for line in f:
+            try:
+                yield json_loads(line)
+            except ValueError:  # Also covers a multi-byte character cut in half
+                print(f"Skipping unreadable line in {journal_file}.")
+
+
+class ExamStore:
+    """Scraped exams kept in memory, persisted as a JSON snapshot plus an append-only JSONL journal.
+
+    Every new or changed exam is appended to the journal as one line; the snapshot is only
+    rewritten every SNAPSHOT_EVERY journaled exams (or 1/SNAPSHOT_JOURNAL_RATIO of all exams,
+    if that's more) or SNAPSHOT_SECONDS, and on close, after
+    which the journal is reset. Completed cargos are checkpointed next to the snapshot, and only
+    together with it, so a cargo is never marked done before its exams are on disk.
+    """
+
+    def __init__(self, output_json_file, snapshot_every=SNAPSHOT_EVERY, snapshot_seconds=SNAPSHOT_SECONDS,
+                 compact=False, seed_json_file=None):
+        self.output_json_file = output_json_file
+        self.journal_file = journal_path(output_json_file)
+        self.snapshot_every = snapshot_every
+        self.snapshot_seconds = snapshot_seconds
+        self._last_snapshot = time.monotonic()
+        self.compact = compact
+        self.cargos_done_file = cargos_done_path(output_json_file)
+        if seed_json_file and not os.path.exists(output_json_file):
+            self.exams = load_existing_data(seed_json_file)
+            self.cargos_done = load_cargos_done(cargos_done_path(seed_json_file))
+        else:
+            self.exams = load_existing_data(output_json_file)
+            self.cargos_done = load_cargos_done(self.cargos_done_file)
+        self._index = {}
+        self._pdf_urls_by_url = {}  # Normalized exam page URL -> PdfUrls, for exams that have them
+        for i, exam in enumerate(self.exams):
+            intern_exam_fields(exam)
+            self._index.setdefault(build_exam_key(exam), i)
+            self._remember_pdf_urls(exam)
+        self._unsaved = self._replay_journal()
+        if not self.exams and any(done.get("exam_count") for done in self.cargos_done.values()):
+            # The output was deleted or unreadable; the cargos it recorded as done must be crawled again
+            print(f"{self.output_json_file} has no exams, ignoring the completed cargos in {self.cargos_done_file}.")
+            self.cargos_done = {}
+        self._journal = open(self.journal_file, "ab", buffering=JSON_WRITE_BUFFER_SIZE)
+
+    def _replay_journal(self):
+        """Apply exams journaled after the last snapshot, e.g. by a run that crashed"""
+        replayed = 0
+        for exam in read_journal(self.journal_file):
+            self._apply(exam)
+            replayed += 1
+
+        if replayed:
+            print(f"Replayed {replayed} journaled entries from {self.journal_file}.")
+        return replayed
+
+    def _remember_pdf_urls(self, exam):
+        if 'PdfUrls' in exam and exam.get('url'):
+            self._pdf_urls_by_url[normalize_url(exam['url'])] = exam['PdfUrls']
+
+    def _apply(self, exam):
+        """Replace the exam with the same key, or append it; returns False when nothing changed"""
+        exam_key = build_exam_key(intern_exam_fields(exam))
+        self._remember_pdf_urls(exam)
+        found_exam_index = self._index.get(exam_key, -1)
+        if found_exam_index == -1:
+            self._index[exam_key] = len(self.exams)
+            self.exams.append(exam)
+        elif self.exams[found_exam_index] != exam:
+            self.exams[found_exam_index] = exam
+        else:
+            return False
+        return True
+
+    def find(self, exam_key):
+        """Index of the exam with this key in self.exams, or -1"""
+        return self._index.get(exam_key, -1)
+
+    def holds_listing(self, exam_links):
+        """True when every exam of a cargo's listing is stored with its PdfUrls"""
+        for exam_details in exam_links:
+            found_exam_index = self._index.get(build_exam_key(exam_details), -1)
+            if found_exam_index == -1 or 'PdfUrls' not in self.exams[found_exam_index]:
+                return False
+        return True
+
+    def known_pdf_urls(self, exam_url):
+        """PdfUrls already scraped from this exam page, e.g. under a key whose details changed since; else None"""
+        return self._pdf_urls_by_url.get(normalize_url(exam_url))
+
+    def add(self, exam):
+        """Append and journal an exam whose key is not stored yet"""
+        self._index[build_exam_key(intern_exam_fields(exam))] = len(self.exams)
+        self.exams.append(exam)
+        self.record(exam)
+
+    def upsert(self, exam):
+        """Store an exam produced elsewhere (e.g. by a shard process), journaling it if it is new or changed"""
+        if self._apply(exam):
+            self.record(exam)
+
+    def cargo_is_fresh(self, cargo_name, max_age=CARGO_RECRAWL_AFTER):
+        done = self.cargos_done.get(cargo_name)
+        return (bool(done) and not done.get("needs_retry")
+                and time.time() - done.get("last_updated", 0) < max_age)
+
+    def mark_cargo_done(self, cargo_name, exam_count):
+        self.cargos_done[cargo_name] = {"last_updated": time.time(), "exam_count": exam_count}
+
+    def mark_cargo_needs_retry(self, cargo_name):
+        self.cargos_done[cargo_name] = {"last_updated": time.time(), "needs_retry": True}
+
+    def record(self, exam):
+        """Journal a new or updated exam"""
+        self._remember_pdf_urls(exam)
+        self._journal.write(json_dumps_line(exam))
+        self._unsaved += 1
+
+    def checkpoint(self):
+        """Push journaled lines to disk and rewrite the snapshot once enough have piled up"""
+        self._journal.flush()
+        os.fsync(self._journal.fileno())  # Once per cargo: survives an OS crash, not just a process crash
+        batch_size = max(self.snapshot_every, len(self.exams) // SNAPSHOT_JOURNAL_RATIO)
+        if self._unsaved >= batch_size or (
+                self._unsaved and time.monotonic() - self._last_snapshot >= self.snapshot_seconds):
+            self.save_snapshot()
+
+    def save_snapshot(self):
+        if not save_data_to_json(self.exams, self.output_json_file, compact=self.compact):
+            return
+        save_data_to_json(self.cargos_done, self.cargos_done_file)
+        self._journal.close()
+        self._journal = open(self.journal_file, "wb", buffering=JSON_WRITE_BUFFER_SIZE)
+        self._unsaved = 0
+        self._last_snapshot = time.monotonic()
+
+    def close(self):
+        if self._journal.closed:
+            return
+        self.save_snapshot()
+        self._journal.close()
+
+
+async def scrape_cargos(cargos, output_json_file, use_cache=True, compact_json=False, force=False,
+                        seed_json_file=None, refresh_cache=False, parallel_pages=MAX_PARALLEL_PAGES):
+    """Scrape the given cargo slugs in this process with one browser, persisting to output_json_file"""
+    http_cache = HttpCache(enabled=use_cache, refresh=refresh_cache)
+    exam_store = ExamStore(output_json_file, compact=compact_json, seed_json_file=seed_json_file)
+
+    # (name, url) of each cargo, derived once from its slug
+    cargo_items = [(cargo_name_from_slug(path), BASE_URL + path) for path in cargos]
+    if not force:
+        pending_items = [item for item in cargo_items if not exam_store.cargo_is_fresh(item[0])]
+        if len(pending_items) < len(cargo_items):
+            print(f"Skipping {len(cargo_items) - len(pending_items)} cargos crawled in the last "
+                  f"{CARGO_RECRAWL_AFTER // 3600} hours (use --force to crawl them again).")
+        cargo_items = pending_items
+
+    cargo_queue = asyncio.Queue()
+    for i, (cargo_name, cargo_url) in enumerate(cargo_items):
+        cargo_queue.put_nowait((i, cargo_name, cargo_url))
+
+    # asyncio.run already turns Ctrl+C into a cancellation; do the same for SIGTERM so the
+    # finally block below still writes the snapshot when the scraper is killed
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except (NotImplementedError, RuntimeError):
+        pass  # Not supported on Windows event loops or outside the main thread
+
+    try:
+        if not cargo_items:
+            return  # Every cargo is fresh; closing the store below still folds the journal into the snapshot
+        async with async_playwright() as playwright:
+            # One context for every worker, so they share its connections, cookies and HTTP cache. It is
+            # persistent so that cache outlives the run; each output file (e.g. each shard process) gets
+            # its own profile since Chromium locks it, and --no-cache uses a throwaway one
+            profile_dir = ""
+            if use_cache:
+                output_stem = os.path.splitext(os.path.basename(output_json_file))[0]
+                profile_dir = os.path.join(BROWSER_PROFILE_DIR, output_stem)
+            context = await playwright.chromium.launch_persistent_context(
+                profile_dir, headless=True, args=CHROMIUM_ARGS, user_agent=USER_AGENT, **CONTEXT_OPTIONS)
+            await context.route("**/*", block_unneeded_requests)
+            page_pool = PagePool(context)
+            page_semaphore = asyncio.Semaphore(parallel_pages)
+            rate_limiter = RateLimiter(REQUESTS_PER_SECOND)
+            # As many cargo workers as page slots, so that while one cargo waits on its listing or
+            # its last few exams, the others keep every slot busy
+            workers = [
+                cargo_worker(page_pool, cargo_queue, page_semaphore, rate_limiter, http_cache, exam_store,
+                             len(cargo_items), force)
+                for _ in range(min(parallel_pages, len(cargo_items)))
+            ]
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                await page_pool.close()
+                await context.close()  # Also shuts the browser down
+    finally:
+        exam_store.close()
+
+
+def scrape_shard(cargos, shard_json_file, output_json_file, use_cache, compact_json, force, refresh_cache,
+                 parallel_pages):
+    """Process pool entry point: one event loop and one Chromium per shard"""
+    asyncio.run(scrape_cargos(cargos, shard_json_file, use_cache, compact_json, force,
+                              seed_json_file=output_json_file, refresh_cache=refresh_cache,
+                              parallel_pages=parallel_pages))
+
+
+def merge_shard_exam(exam_store, seed_exams, exam):
+    """Upsert one exam of a shard's output, unless it is the shard's untouched copy of the seed"""
+    exam_key = build_exam_key(exam)
+    if seed_exams.get(exam_key) == exam:
+        return
+    found_exam_index = exam_store.find(exam_key)
+    if (found_exam_index != -1 and 'PdfUrls' not in exam
+            and 'PdfUrls' in exam_store.exams[found_exam_index]):
+        # A shard that failed to fetch this exam mustn't drop the PDFs another shard found
+        exam = dict(exam, PdfUrls=exam_store.exams[found_exam_index]['PdfUrls'])
+    exam_store.upsert(exam)
+
+
+def merge_shard_files(output_json_file, shard_json_files, compact_json=False):
+    """Fold every shard's snapshot and journal into the main output, then remove the shard files"""
+    # Each shard started from a full copy of the output, so only what a shard changed in its copy is
+    # merged; otherwise a later shard's stale copy would revert an earlier shard's updates
+    seed_exams = {build_exam_key(exam): exam for exam in load_existing_data(output_json_file)}
+    exam_store = ExamStore(output_json_file, compact=compact_json)
+    try:
+        for shard_json_file in shard_json_files:
+            shard_journal_file = journal_path(shard_json_file)
+            if os.path.exists(shard_json_file):
+                for exam in load_existing_data(shard_json_file):
+                    merge_shard_exam(exam_store, seed_exams, exam)
+            for exam in read_journal(shard_journal_file):
+                merge_shard_exam(exam_store, seed_exams, exam)
+            for cargo_name, done in load_cargos_done(cargos_done_path(shard_json_file)).items():
+                if done.get("last_updated", 0) > exam_store.cargos_done.get(cargo_name, {}).get("last_updated", 0):
+                    exam_store.cargos_done[cargo_name] = done
+            exam_store.checkpoint()
+    finally:
+        exam_store.close()
+
+    for shard_json_file in shard_json_files:
+        for path in (shard_json_file, journal_path(shard_json_file), cargos_done_path(shard_json_file)):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def load_cargos(file_path=CARGOS_FILE):
+    """One cargo slug per line, blank lines and # comments are ignored"""
+    with open(file_path, "r", encoding="utf-8") as f:
+        slugs = (line.split("#", 1)[0].strip() for line in f)
+        return [slug for slug in slugs if slug]
+
+
+def in_shard(slug, shard):
+    """Whether a cargo belongs to shard (index, count); stable across runs, machines and list edits"""
+    index, count = shard
+    return zlib.crc32(slug.encode("utf-8")) % count == index
+
+
+def positive_int(value):
+    """argparse type for an integer >= 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def non_negative_int(value):
+    """argparse type for an integer >= 0"""
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must be at least 0, got {number}")
+    return number
+
+
+def parse_shard(value):
+    """argparse type for "K/N": the K-th (0-based) of N shards"""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected K/N, got {value!r}")
+    if count < 1:
+        raise argparse.ArgumentTypeError(f"N must be at least 1, got {count}")
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 0 and {count - 1}, got {index}")
+    return index, count
+
+
+def main(use_cache=True, compact_json=False, processes=1, start=None, end=None, force=False,
+         cargos_file=CARGOS_FILE, shard=None, refresh_cache=False, parallel_pages=MAX_PARALLEL_PAGES):
     output_json_file = "output.json"
 
-    # Create the JSON file immediately if it doesn't exist
+    cargos = load_cargos(cargos_file)[start:end]
+    if shard:
+        cargos = [slug for slug in cargos if in_shard(slug, shard)]
+    if not cargos:
+        print("No cargos selected, nothing to scrape.")
+        return
+
+    # Create the JSON file immediately if it doesn't exist; an existing one is loaded and extended.
+    # Only a file that can't be created stops the run, since nothing could be saved
     if not create_initial_json_file(output_json_file):
-        print("The output.json file already exists and will be used to add pending exams.")
+        print(f"Could not create {output_json_file}. Nothing was scraped.")
         return
 
-    # Load existing data
-    all_exams_data = load_existing_data(output_json_file)
-
-    base_url = "https://www.pciconcursos.com.br/provas/"
-    cargos = [
-        "administracao",
-        "administrador",
-        "administrador-hospitalar",
-        "administrador-junior",
-        "advogado",
-        "advogado-junior",
-        "agente-administrativo",
-        "agente-administrativo-i",
-        "agente-comunitario-de-saude",
-        "agente-de-combate-as-endemias",
-        "agente-de-defesa-civil",
-        "agente-de-endemias",
-        "agente-de-fiscalizacao",
-        "agente-de-policia",
-        "agente-de-portaria",
-        "agente-de-saude",
-        "agente-de-servicos-gerais",
-        "agente-de-transito",
-        "agente-de-vigilancia-sanitaria",
-        "agente-fiscal",
-        "agente-municipal-de-transito",
-        "agente-operacional",
-        "agente-penitenciario",
-        "agente-social",
-        "almoxarife",
-        "analista-administrativo",
-        "analista-ambiental",
-        "analista-contabil",
-        "analista-de-controle-interno",
-        "analista-de-informatica",
-        "analista-de-recursos-humanos",
-        "analista-de-sistema",
-        "analista-de-sistemas",
-        "analista-de-suporte",
-        "analista-de-tecnologia-da-informacao",
-        "analista-financeiro",
-        "analista-judiciario-administrativa",
-        "analista-judiciario-analise-de-sistemas",
-        "analista-judiciario-arquitetura",
-        "analista-judiciario-arquivologia",
-        "analista-judiciario-assistente-social",
-        "analista-judiciario-biblioteconomia",
-        "analista-judiciario-contabilidade",
-        "analista-judiciario-engenharia-civil",
-        "analista-judiciario-engenharia-eletrica",
-        "analista-judiciario-estatistica",
-        "analista-judiciario-execucao-de-mandados",
-        "analista-judiciario-medicina",
-        "analista-judiciario-odontologia",
-        "analista-judiciario-psicologia",
-        "analista-juridico",
-        "arquiteto",
-        "arquiteto-e-urbanista",
-        "arquivista",
-        "arquivologista",
-        "assessor-juridico",
-        "assistente-administrativo",
-        "assistente-administrativo-i",
-        "assistente-de-administracao",
-        "assistente-de-alunos",
-        "assistente-de-informatica",
-        "assistente-de-laboratorio",
-        "assistente-em-administracao",
-        "assistente-juridico",
-        "assistente-legislativo",
-        "assistente-social",
-        "assistente-tecnico",
-        "assistente-tecnico-administrativo",
-        "atendente",
-        "atendente-de-consultorio-dentario",
-        "atendente-de-farmacia",
-        "auditor",
-        "auditor-fiscal",
-        "auxiliar-administrativo",
-        "auxiliar-de-administracao",
-        "auxiliar-de-almoxarifado",
-        "auxiliar-de-biblioteca",
-        "auxiliar-de-consultorio-dentario",
-        "auxiliar-de-consultorio-odontologico",
-        "auxiliar-de-contabilidade",
-        "auxiliar-de-cozinha",
-        "auxiliar-de-creche",
-        "auxiliar-de-dentista",
-        "auxiliar-de-enfermagem",
-        "auxiliar-de-enfermagem-do-trabalho",
-        "auxiliar-de-farmacia",
-        "auxiliar-de-laboratorio",
-        "auxiliar-de-manutencao",
-        "auxiliar-de-mecanico",
-        "auxiliar-de-odontologia",
-        "auxiliar-de-saude-bucal",
-        "auxiliar-de-secretaria",
-        "auxiliar-de-secretaria-escolar",
-        "auxiliar-de-servicos",
-        "auxiliar-de-servicos-gerais",
-        "auxiliar-em-administracao",
-        "auxiliar-em-enfermagem",
-        "auxiliar-em-saude-bucal",
-        "auxiliar-odontologico",
-        "auxiliar-operacional",
-        "bibliotecario",
-        "bibliotecario-documentalista",
-        "biblioteconomista",
-        "biologo",
-        "biomedico",
-        "bioquimico",
-        "bombeiro",
-        "bombeiro-hidraulico",
-        "borracheiro",
-        "calceteiro",
-        "cargos-ensino-fundamental",
-        "cargos-ensino-fundamental-completo",
-        "cargos-ensino-fundamental-incompleto",
-        "cargos-ensino-medio",
-        "carpinteiro",
-        "ciencias-contabeis",
-        "cirurgiao-dentista",
-        "contador",
-        "contador-junior",
-        "continuo",
-        "controlador-interno",
-        "coordenador-pedagogico",
-        "coveiro",
-        "cozinheira",
-        "cozinheiro",
-        "defensor-publico",
-        "delegado-de-policia",
-        "dentista",
-        "desenhista",
-        "desenhista-projetista",
-        "digitador",
-        "direito",
-        "economista",
-        "economista-junior",
-        "educacao-fisica",
-        "educador-fisico",
-        "educador-infantil",
-        "educador-social",
-        "eletricista",
-        "encanador",
-        "enfermagem",
-        "enfermeiro",
-        "enfermeiro-psf",
-        "enfermeiro-do-trabalho",
-        "enfermeiro-padrao",
-        "enfermeiro-plantonista",
-        "engenharia-civil",
-        "engenharia-eletrica",
-        "engenharia-mecanica",
-        "engenheiro",
-        "engenheiro-agrimensor",
-        "engenheiro-agronomo",
-        "engenheiro-ambiental",
-        "engenheiro-cartografico",
-        "engenheiro-civil",
-        "engenheiro-civil-junior",
-        "engenheiro-de-alimentos",
-        "engenheiro-de-pesca",
-        "engenheiro-de-producao",
-        "engenheiro-de-seguranca-do-trabalho",
-        "engenheiro-de-telecomunicacoes",
-        "engenheiro-eletricista",
-        "engenheiro-eletrico",
-        "engenheiro-eletronico",
-        "engenheiro-florestal",
-        "engenheiro-mecanico",
-        "engenheiro-quimico",
-        "engenheiro-sanitarista",
-        "escriturario",
-        "especialista-em-educacao",
-        "estagio-em-direito",
-        "estatistico",
-        "farmaceutico",
-        "fiscal",
-        "fiscal-ambiental",
-        "fiscal-de-meio-ambiente",
-        "fiscal-de-obras",
-        "fiscal-de-obras-e-posturas",
-        "fiscal-de-posturas",
-        "fiscal-de-tributos",
-        "fiscal-de-vigilancia-sanitaria",
-        "fiscal-municipal",
-        "fiscal-sanitario",
-        "fiscal-tributario",
-        "fisico",
-        "fisioterapeuta",
-        "fisioterapia",
-        "fotografo",
-        "gari",
-        "geografo",
-        "geologo",
-        "guarda-municipal",
-        "historiador",
-        "inspetor-de-alunos",
-        "instrutor-de-informatica",
-        "instrutor-de-libras",
-        "interprete-de-libras",
-        "jardineiro",
-        "jornalista",
-        "juiz",
-        "juiz-do-trabalho",
-        "juiz-do-trabalho-substituto",
-        "juiz-federal-substituto",
-        "juiz-substituto",
-        "marceneiro",
-        "mecanico",
-        "medico",
-        "medico-cardiologia",
-        "medico-cirurgia-geral",
-        "medico-cirurgia-pediatrica",
-        "medico-clinica-medica",
-        "medico-dermatologia",
-        "medico-endocrinologia",
-        "medico-medicina-do-trabalho",
-        "medico-neurocirurgia",
-        "medico-neurologia",
-        "medico-oftalmologia",
-        "medico-otorrinolaringologia",
-        "medico-pediatria",
-        "medico-pneumologia",
-        "medico-psf",
-        "medico-psiquiatria",
-        "medico-urologia",
-        "medico-anestesiologista",
-        "medico-cardiologista",
-        "medico-cirurgiao-geral",
-        "medico-clinico-geral",
-        "medico-da-familia",
-        "medico-ginecologista",
-        "medico-ginecologista-e-obstetra",
-        "medico-hematologista",
-        "medico-infectologista",
-        "medico-intensivista",
-        "medico-nefrologista",
-        "medico-neurologista",
-        "medico-obstetra",
-        "medico-oftalmologista",
-        "medico-ortopedista",
-        "medico-pediatra",
-        "medico-plantonista",
-        "medico-psiquiatra",
-        "medico-radiologista",
-        "medico-veterinario",
-        "merendeira",
-        "mestre-de-obras",
-        "monitor",
-        "monitor-de-creche",
-        "monitor-de-informatica",
-        "motorista",
-        "motorista-d",
-        "motorista-de-ambulancia",
-        "motorista-de-veiculos-leves",
-        "motorista-de-veiculos-pesados",
-        "musico",
-        "nutricionista",
-        "odontologo",
-        "odontologo-endodontia",
-        "odontologo-psf",
-        "oficial",
-        "oficial-administrativo",
-        "oficial-de-justica",
-        "operador-de-computador",
-        "operador-de-maquina",
-        "operador-de-maquinas-agricolas",
-        "operador-de-maquinas-pesadas",
-        "operario",
-        "orientador-educacional",
-        "orientador-pedagogico",
-        "orientador-social",
-        "pedagogo",
-        "pedreiro",
-        "perito-criminal",
-        "pintor",
-        "porteiro",
-        "procurador",
-        "procurador-juridico",
-        "professor",
-        "professor-artes",
-        "professor-biologia",
-        "professor-ciencias",
-        "professor-educacao-fisica",
-        "professor-educacao-infantil",
-        "professor-ensino-religioso",
-        "professor-espanhol",
-        "professor-fisica",
-        "professor-geografia",
-        "professor-historia",
-        "professor-informatica",
-        "professor-ingles",
-        "professor-lingua-inglesa",
-        "professor-lingua-portuguesa",
-        "professor-matematica",
-        "professor-portugues",
-        "professor-quimica",
-        "professor-series-iniciais",
-        "professor-de-1-a-4-series",
-        "professor-de-arte",
-        "professor-de-artes",
-        "professor-de-biologia",
-        "professor-de-ciencias",
-        "professor-de-educacao-artistica",
-        "professor-de-educacao-basica",
-        "professor-de-educacao-basica-i",
-        "professor-de-educacao-basica-ii-matematica",
-        "professor-de-educacao-especial",
-        "professor-de-educacao-fisica",
-        "professor-de-educacao-infantil",
-        "professor-de-ensino-fundamental",
-        "professor-de-ensino-religioso",
-        "professor-de-espanhol",
-        "professor-de-filosofia",
-        "professor-de-fisica",
-        "professor-de-geografia",
-        "professor-de-historia",
-        "professor-de-informatica",
-        "professor-de-ingles",
-        "professor-de-libras",
-        "professor-de-matematica",
-        "professor-de-musica",
-        "professor-de-portugues",
-        "professor-de-quimica",
-        "professor-de-sociologia",
-        "programador",
-        "programador-de-computador",
-        "programador-visual",
-        "psicologo",
-        "psicologo-clinico",
-        "psicopedagogo",
-        "publicitario",
-        "recepcionista",
-        "relacoes-publicas",
-        "sanitarista",
-        "secretaria",
-        "secretario-de-escola",
-        "secretario-escolar",
-        "secretario-executivo",
-        "serralheiro",
-        "servente",
-        "servente-de-pedreiro",
-        "servicos-gerais",
-        "sociologo",
-        "soldador",
-        "supervisor-de-ensino",
-        "tecnico-administrativo",
-        "tecnico-agricola",
-        "tecnico-de-enfermagem",
-        "tecnico-de-informatica",
-        "tecnico-de-laboratorio",
-        "tecnico-de-seguranca-do-trabalho",
-        "tecnico-em-radiologia",
-        "tecnico-em-saude-bucal",
-        "telefonista",
-        "terapeuta-ocupacional",
-        "tesoureiro",
-        "topografo",
-        "tratorista",
-        "veterinario",
-        "vigia",
-        "vigilante",
-        "zelador"
-    ]
-
-    with sync_playwright() as playwright:
-        browser = playwright.chromium.launch(headless=True)
-        context = browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
-        page = context.new_page()
-
-        for i, path in enumerate(cargos):
-            cargo_url = base_url + path
-            cargo_name = path.replace('-', ' ').title()
-            print(f"\nProcessing CARGO {i + 1}/{len(cargos)}: {cargo_name}")
-            process_cargo_page(page, cargo_name, cargo_url, all_exams_data, output_json_file)
-
-            time.sleep(3)
-
-        browser.close()
+    if processes == 0:
+        processes = os.cpu_count() or 1
+    processes = min(processes, len(cargos))  # More processes than cargos would only launch idle browsers
+
+    if processes <= 1:
+        asyncio.run(scrape_cargos(cargos, output_json_file, use_cache, compact_json, force,
+                                  refresh_cache=refresh_cache, parallel_pages=parallel_pages))
+    else:
+        stem = os.path.splitext(output_json_file)[0]
+        shard_json_files = [f"{stem}.shard{i}.json" for i in range(processes)]
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [
+                executor.submit(scrape_shard, cargos[i::processes], shard_json_files[i], output_json_file,
+                                use_cache, compact_json, force, refresh_cache, parallel_pages)
+                for i in range(processes)
+            ]
+            for i, future in enumerate(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Shard {i} failed: {e}")
+        merge_shard_files(output_json_file, shard_json_files, compact_json)
 
     print(f"\nAll data successfully saved to {output_json_file}")
     print("PDF URL extraction completed!")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrape exam PDF URLs from pciconcursos.com.br")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"ignore and do not fill the page cache in {HTTP_CACHE_DIR}/")
+    parser.add_argument("--refresh", action="store_true",
+                        help=f"fetch every page again, but still update the page cache in {HTTP_CACHE_DIR}/")
+    parser.add_argument("--compact-json", action="store_true",
+                        help="write the output JSON without indentation")
+    parser.add_argument("--processes", type=non_negative_int, default=1,
+                        help=f"split the cargos across this many processes, each with its own browser; "
+                             f"0 for one per CPU (this machine has {os.cpu_count()})")
+    parser.add_argument("--parallel-pages", type=positive_int, default=MAX_PARALLEL_PAGES,
+                        help=f"pages to load at once in each process (default: {MAX_PARALLEL_PAGES}); the request "
+                             f"rate is capped separately")
+    parser.add_argument("--cargos-file", default=CARGOS_FILE,
+                        help="file with the cargo slugs to scrape, one per line (default: cargos.txt)")
+    parser.add_argument("--start", type=int, default=None,
+                        help="index of the first cargo in the cargos file to scrape")
+    parser.add_argument("--end", type=int, default=None,
+                        help="index after the last cargo in the cargos file to scrape")
+    parser.add_argument("--shard", type=parse_shard, default=None, metavar="K/N",
+                        help="only scrape the K-th of N disjoint shards of the cargos (0-based), e.g. to split "
+                             "a crawl across machines")
+    parser.add_argument("--force", action="store_true",
+                        help="crawl cargos again even if they were completed recently")
+    parser.add_argument("--verbose", action="store_true",
+                        help="print progress for every exam, not just for every cargo")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    if args.verbose:
+        # The environment also reaches worker processes that import this module afresh
+        os.environ[VERBOSE_ENV_VAR] = "1"
+        _verbose = True
+    main(use_cache=not args.no_cache, compact_json=args.compact_json, processes=args.processes,
+         start=args.start, end=args.end, force=args.force, cargos_file=args.cargos_file,
+         shard=args.shard, refresh_cache=args.refresh, parallel_pages=args.parallel_pages)